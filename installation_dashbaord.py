@@ -1,10 +1,10 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 from PIL import Image
 import re
-import base64
-import requests
+from pathlib import Path
 
 # ======================================================
 # PAGE CONFIG
@@ -36,18 +36,78 @@ def normalize_columns(df):
 
     return df
 
+# ======================================================
+# INSTALLATION STATUS STANDARDIZATION
+# ======================================================
+STATUS_CATEGORIES = ["Completed", "Not Completed", "Pending"]
+
+STATUS_MAP = {
+    "YES": "Completed",
+    "Y": "Completed",
+    "DONE": "Completed",
+    "COMPLETED": "Completed",
+    "NO": "Not Completed",
+    "N": "Not Completed",
+}
+
+def standardize_status(df):
+    # only a handful of distinct answers: factorize once, clean the uniques,
+    # then broadcast back by code (-1 for blanks picks the trailing "Pending")
+    codes, answers = pd.factorize(df["Installation Status"])
+    labels = [STATUS_MAP.get(str(a).strip().upper(), "Pending") for a in answers]
+    status = np.array(labels + ["Pending"], dtype=object)[codes]
+    df["Installation Status"] = pd.Categorical(status, categories=STATUS_CATEGORIES)
+    return df
+
 # ======================================================
 # LOAD DATA
 # ======================================================
+def read_workbook(path):
+    # calamine parses far faster than openpyxl; fall back if it isn't installed
+    # (ImportError) or pandas predates the engine (ValueError, pandas < 2.2)
+    try:
+        return pd.read_excel(path, engine="calamine")
+    except (ImportError, ValueError):
+        return pd.read_excel(path, engine="openpyxl")
+
+# repeated labels used by the filters and groupby; stored as integer codes
+CATEGORY_COLUMNS = ["State", "City", "Partner Store Name"]
+
+# everything the tables, filters and chart read; the rest is dropped at load
+USED_COLUMNS = [
+    "MavenCode",
+    "Partner Store Name",
+    "Store Code",
+    "State",
+    "City",
+    "Installation Status",
+    "Reason",
+    # raw image links for the store image viewer below; restore when it is re-enabled
+    # "Store Front Image", "Before Image", "After Image", "Reporting Form Image",
+]
+
+DATA_FILE = Path("Macan_installation_kV-sheet.xlsx")
+
 @st.cache_data(show_spinner=False)
-def load_data():
-    df = pd.read_excel("Macan_installation_kV-sheet.xlsx")
+def load_data(path, version):
+    # version (mtime, size) keys the cache, so replacing the xlsx invalidates it
+    # without a restart
+    df = read_workbook(path)
     df.columns = [str(c).strip() for c in df.columns]
     df = normalize_columns(df)
+    df = standardize_status(df)
+    df = df[[c for c in USED_COLUMNS if c in df.columns]]
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
     return df
 
 try:
-    df = load_data()
+    data_stat = DATA_FILE.stat()
+    # cached helpers below take frames as unhashed _args and key on this instead,
+    # so after editing load_data() on a running server, restart it or clear the cache
+    data_version = (data_stat.st_mtime_ns, data_stat.st_size)
+    df = load_data(DATA_FILE, data_version)
 except FileNotFoundError:
     st.error("❌ Excel file not found. Please upload 'Maven-data-installation.xlsx'")
     st.stop()
@@ -74,30 +134,13 @@ with col_title:
 
 st.markdown("---")
 
-# ======================================================
-# INSTALLATION STATUS STANDARDIZATION
-# ======================================================
-df["Installation Status"] = (
-    df["Installation Status"]
-    .astype(str)
-    .str.upper()
-    .map({
-        "YES": "Completed",
-        "Y": "Completed",
-        "DONE": "Completed",
-        "COMPLETED": "Completed",
-        "NO": "Not Completed",
-        "N": "Not Completed",
-    })
-    .fillna("Pending")
-)
-
 # ======================================================
 # KPI METRICS
 # ======================================================
 total_stores = len(df)
-completed = (df["Installation Status"] == "Completed").sum()
-not_completed = (df["Installation Status"] == "Not Completed").sum()
+status_counts = df["Installation Status"].value_counts()
+completed = int(status_counts.get("Completed", 0))
+not_completed = int(status_counts.get("Not Completed", 0))
 pending = total_stores - (completed + not_completed)
 
 c1, c2, c3, c4 = st.columns(4)
@@ -113,45 +156,68 @@ st.markdown("---")
 # ======================================================
 st.sidebar.header("🔍 Filters")
 
+@st.cache_data(show_spinner=False)
+def filter_options(_df, version, col):
+    if col not in _df.columns:
+        return []
+    return _df[col].dropna().unique().tolist()
+
 states = st.sidebar.multiselect(
-    "State", df["State"].dropna().unique() if "State" in df.columns else []
+    "State", filter_options(df, data_version, "State")
 )
 cities = st.sidebar.multiselect(
-    "City", df["City"].dropna().unique() if "City" in df.columns else []
+    "City", filter_options(df, data_version, "City")
 )
 partners = st.sidebar.multiselect(
-    "Partner Store Name",
-    df["Partner Store Name"].dropna().unique() if "Partner Store Name" in df.columns else []
+    "Partner Store Name", filter_options(df, data_version, "Partner Store Name")
 )
 
-filtered_df = df.copy()
-if states:
-    filtered_df = filtered_df[filtered_df["State"].isin(states)]
-if cities:
-    filtered_df = filtered_df[filtered_df["City"].isin(cities)]
-if partners:
-    filtered_df = filtered_df[filtered_df["Partner Store Name"].isin(partners)]
+# keyed on free-form selections, so keep only the most recent few dozen
+@st.cache_data(show_spinner=False, max_entries=32)
+def apply_filters(_df, version, states, cities, partners):
+    mask = np.ones(len(_df), dtype=bool)
+    if states:
+        mask &= _df["State"].isin(states).to_numpy()
+    if cities:
+        mask &= _df["City"].isin(cities).to_numpy()
+    if partners:
+        mask &= _df["Partner Store Name"].isin(partners).to_numpy()
+    filtered_df = _df[mask]
+
+    grouped = (
+        filtered_df
+        .groupby(["State", "Installation Status"], observed=True)
+        .size()
+        .reset_index(name="Count")
+    )
+    return filtered_df, grouped
+
+# sorted tuples so the same selection in any click order hits the cache
+filter_key = (
+    tuple(sorted(states, key=str)),
+    tuple(sorted(cities, key=str)),
+    tuple(sorted(partners, key=str)),
+)
+filtered_df, grouped = apply_filters(df, data_version, *filter_key)
 
 # ======================================================
 # BAR CHART – STATUS BY STATE
 # ======================================================
-grouped = (
-    filtered_df
-    .groupby(["State", "Installation Status"])
-    .size()
-    .reset_index(name="Count")
-)
+@st.cache_data(show_spinner=False, max_entries=32)
+def make_status_figure(_grouped, key):
+    fig = px.bar(
+        _grouped,
+        x="State",
+        y="Count",
+        color="Installation Status",
+        barmode="group",
+        text_auto=True,
+        title="Installation Status by State"
+    )
+    fig.update_layout(template="plotly_dark")
+    return fig
 
-fig = px.bar(
-    grouped,
-    x="State",
-    y="Count",
-    color="Installation Status",
-    barmode="group",
-    text_auto=True,
-    title="Installation Status by State"
-)
-fig.update_layout(template="plotly_dark")
+fig = make_status_figure(grouped, (data_version, *filter_key))
 
 st.plotly_chart(fig, use_container_width=True)
 
@@ -199,40 +265,73 @@ else:
     st.info("All stores are completed 🎉")
 
 # # ======================================================
-# # IMAGE HELPERS
+# # IMAGE URLS
 # # ======================================================
-# def convert_photo_url(url):
-#     if pd.isna(url) or not str(url).strip():
-#         return None
-
-#     url = str(url).strip()
-
-#     match = re.search(r"[-\w]{25,}", url)
-#     if match:
-#         return f"https://drive.google.com/uc?export=view&id={match.group(0)}"
-
-#     return url
+# import html
+
+# IMAGE_COLUMNS = [
+#     "Store Front Image",
+#     "Before Image",
+#     "After Image",
+#     "Reporting Form Image",
+# ]
+
+# _DRIVE_ID_RE = re.compile(r"[-\w]{25,}")
+# _IMG_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+# # an http(s) usercontent link, or one whose path (before any ?query/#fragment)
+# # ends in an image extension
+# _IMG_LINK_RE = (
+#     r"^https?://(?:lh3\.googleusercontent\.com/"
+#     r"|[^?#]*(?:" + "|".join(re.escape(ext) for ext in _IMG_EXTS) + r")(?:[?#]|$))"
+# )
 
-# @st.cache_data(show_spinner=False)
-# def fetch_image(url):
-#     try:
-#         r = requests.get(url, timeout=6)
-#         if r.status_code == 200:
-#             return "data:image/jpeg;base64," + base64.b64encode(r.content).decode()
-#     except:
-#         pass
-#     return None
+# # Drive resizes server-side; a viewer tile is a quarter of the page, so ~2x its width
+# IMAGE_WIDTH = 800
+
+# def add_image_urls(df):
+#     # one vectorized pass per column; Drive links become direct usercontent URLs,
+#     # other links are kept only if they already point at an image
+#     for col in IMAGE_COLUMNS:
+#         if col not in df.columns:
+#             continue
+#         raw = df[col].astype("string").str.strip().replace("", pd.NA)
+#         ids = raw.str.extract(f"({_DRIVE_ID_RE.pattern})", expand=False)
+#         direct = raw.where(raw.str.contains(_IMG_LINK_RE, case=False, regex=True, na=False))
+#         df[f"{col} URL"] = ("https://lh3.googleusercontent.com/d/" + ids + f"=w{IMAGE_WIDTH}").fillna(direct)
+#     return df
 
 # # ======================================================
 # # STORE IMAGE VIEWER
 # # ======================================================
 # st.header("📸 Store Images Viewer")
 
-# store_list = filtered_df["MavenCode"].dropna().unique().tolist()
+# @st.cache_data(show_spinner=False, max_entries=32)
+# def viewer_stores(_filtered_df, filter_key):
+#     viewer_df = add_image_urls(_filtered_df.copy())
+
+#     # only page through stores that have at least one image to show
+#     url_cols = [f"{col} URL" for col in IMAGE_COLUMNS if f"{col} URL" in viewer_df.columns]
+#     viewer_df = viewer_df[viewer_df[url_cols].notna().any(axis=1)]
+
+#     # one hash lookup per click instead of a boolean scan over filtered_df
+#     rows_by_code = viewer_df.drop_duplicates("MavenCode").set_index("MavenCode", drop=False)
+#     return rows_by_code, viewer_df["MavenCode"].dropna().unique().tolist()
+
+# viewer_key = (data_version, *filter_key)
+# rows_by_code, store_list = viewer_stores(filtered_df, viewer_key)
+
+# if not store_list:
+#     st.info("No stores with images for the current filters.")
+#     st.stop()
 
 # if "store_index" not in st.session_state:
 #     st.session_state.store_index = 0
 
+# # a new filter selection can shrink the list under the saved index
+# if st.session_state.get("viewer_key") != viewer_key:
+#     st.session_state.viewer_key = viewer_key
+#     st.session_state.store_index = min(st.session_state.store_index, len(store_list) - 1)
+
 # c_prev, c_mid, c_next = st.columns([1, 2, 1])
 
 # with c_prev:
@@ -249,30 +348,40 @@ else:
 #     if st.button("Next ➡") and st.session_state.store_index < len(store_list) - 1:
 #         st.session_state.store_index += 1
 
-# row = filtered_df[filtered_df["MavenCode"] == store_list[st.session_state.store_index]].iloc[0]
+# row = rows_by_code.loc[store_list[st.session_state.store_index]]
 
 # st.markdown(
 #     f"### 🏬 **{row['Partner Store Name']}** — *{row['City']}, {row['State']}* ({row['MavenCode']})"
 # )
 
 # images = {
-#     "Store Front": row.get("Store Front Image"),
-#     "Before Installation": row.get("Before Image"),
-#     "After Installation": row.get("After Image"),
-#     "Reporting Form": row.get("Reporting Form Image"),
+#     "Store Front": row.get("Store Front Image URL"),
+#     "Before Installation": row.get("Before Image URL"),
+#     "After Installation": row.get("After Image URL"),
+#     "Reporting Form": row.get("Reporting Form Image URL"),
 # }
 
-# cols = st.columns(4)
-# for col, (label, url) in zip(cols, images.items()):
-#     with col:
-#         img = fetch_image(convert_photo_url(url))
-#         if img:
-#             st.markdown(
-#                 f"""
-#                 <img src="{img}" style="width:100%;height:220px;object-fit:cover;border-radius:8px;border:1px solid #444;">
-#                 <p style="text-align:center;color:#aaa;">{label}</p>
-#                 """,
-#                 unsafe_allow_html=True
-#             )
-#         else:
-#             st.warning(f"{label} not available")
+# # one markdown element for the whole row instead of four columns + four writes
+# tiles = []
+# for label, img in images.items():
+#     if pd.notna(img):
+#         # spreadsheet text goes into an HTML attribute; never let it close the quote
+#         img = html.escape(img, quote=True)
+#         tiles.append(
+#             f'<figure style="margin:0;">'
+#             f'<img src="{img}" loading="lazy" decoding="async" alt="{label}" style="width:100%;height:220px;object-fit:cover;border-radius:8px;border:1px solid #444;">'
+#             f'<figcaption style="text-align:center;color:#aaa;">{label}</figcaption>'
+#             f'</figure>'
+#         )
+#     else:
+#         tiles.append(
+#             f'<div style="height:220px;display:flex;align-items:center;justify-content:center;'
+#             f'border-radius:8px;border:1px dashed #444;color:#aaa;">{label} not available</div>'
+#         )
+
+# st.markdown(
+#     '<div style="display:grid;grid-template-columns:repeat(4,1fr);gap:8px;">'
+#     + "".join(tiles)
+#     + "</div>",
+#     unsafe_allow_html=True
+# )